@@ -1,19 +1,37 @@
 import paho.mqtt.client as mqtt
 import subprocess
+import mmap
+import os
 import time
+import atexit
+import glob
 import logging
+import logging.handlers
+import queue
 import signal
+import socket
 import sys
-from threading import Lock
+from collections import deque
+from threading import Event, RLock, Thread
 
-# Setup logging
+try:
+    import gpiod  # libgpiod v2 bindings - optional, used when /dev/gpiomem is unusable
+except ImportError:
+    gpiod = None
+
+# Setup logging - records are queued here and written by a listener thread,
+# so the MQTT callbacks never block on disk or console I/O
+log_queue = queue.SimpleQueue()  # Reentrant - cleanup_and_exit logs from a signal handler
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/tmp/fpga_controller.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(log_queue)]
+)
+log_listener = logging.handlers.QueueListener(
+    log_queue,
+    logging.FileHandler('/tmp/fpga_controller.log', delay=True),
+    logging.StreamHandler(),
+    respect_handler_level=True
 )
 logger = logging.getLogger(__name__)
 
@@ -39,144 +57,403 @@ GPIO_PINS = {
     }
 }
 
-current_state = {
-    'fpga1': {'dan': False, 'nate': False, 'ben': False, 'loaded': False},
-    'fpga2': {'dan': False, 'nate': False, 'ben': False, 'loaded': False},
-    'fpga3': {'dan': False, 'nate': False, 'ben': False, 'loaded': False}
+# BCM2835/6/7 and BCM2711 GPIO register block, exposed without root via /dev/gpiomem
+GPIO_MEM_PATH = '/dev/gpiomem'
+GPIO_MEM_SIZE = 4096
+GPFSEL0 = 0x00  # Function select - 3 bits per pin, 10 pins per register
+GPSET0 = 0x1C   # Output set - 1 bit per pin, GPSET1 follows at 0x20
+GPCLR0 = 0x28   # Output clear - 1 bit per pin, GPCLR1 follows at 0x2C
+GPIO_FSEL_OUTPUT = 0b001
+GPIO_BANKS = 2  # GPIO 0-31 in bank 0, GPIO 32-53 in bank 1
+BCM_GPIO_COMPATIBLE = (b'brcm,bcm2835', b'brcm,bcm2836', b'brcm,bcm2837', b'brcm,bcm2711')
+
+# libgpiod chip driving the 40-pin header - found by label, since its
+# gpiochip number differs between Pi models and kernel versions
+GPIO_CHIP_LABELS = ('pinctrl-rp1', 'pinctrl-bcm2711', 'pinctrl-bcm2835')
+PINCTRL_PATH = '/usr/bin/pinctrl'
+
+# Local broker - Unix socket listener (see config/mosquitto.conf), TCP as fallback
+MQTT_SOCKET_PATH = '/run/mosquitto/mqtt.sock'
+MQTT_HOST = 'localhost'
+MQTT_PORT = 1883
+MQTT_KEEPALIVE = 60
+MQTT_MAX_INFLIGHT = 1          # Status updates are tiny - no need to pipeline
+MQTT_RECONNECT_DELAY = (1, 5)  # Seconds - min/max backoff after the broker drops
+MQTT_SOCKET_BUFFER = 64 * 1024  # SO_SNDBUF/SO_RCVBUF for the broker connection
+
+# Command batching - a burst is flushed once it is full or the window expires
+BATCH_MAX_OPS = 12    # One pending change per LED
+BATCH_WINDOW = 0.001  # Seconds to wait for more changes after the first
+
+def open_gpio_registers():
+    """Map the GPIO registers as 32-bit words, or None if unavailable"""
+    try:
+        # The Pi 5 routes GPIO through RP1, which has a different register layout
+        with open('/proc/device-tree/compatible', 'rb') as f:
+            compatible = f.read().split(b'\0')
+        if not any(c in BCM_GPIO_COMPATIBLE for c in compatible):
+            logger.warning("No BCM GPIO block found - using libgpiod/pinctrl")
+            return None
+        fd = os.open(GPIO_MEM_PATH, os.O_RDWR | os.O_SYNC)
+        try:
+            mem = mmap.mmap(fd, GPIO_MEM_SIZE, mmap.MAP_SHARED,
+                            mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        return memoryview(mem).cast('I')
+    except OSError as e:
+        logger.warning(f"Cannot map {GPIO_MEM_PATH} ({e}) - using libgpiod/pinctrl")
+        return None
+
+gpio_regs = open_gpio_registers()
+
+LED_TEST_DURATION = 0.3  # Seconds all LEDs stay lit during the startup test
+
+# LED state bit index - (fpga1, dan) is bit 0 ... (fpga3, loaded) is bit 11
+STATE_BIT = {
+    led: bit for bit, led in enumerate(
+        (fpga_id, user_type) for fpga_id, pins in GPIO_PINS.items() for user_type in pins)
+}
+
+# Pin masks span both banks - bit N is GPIO N
+PIN_MASK_FOR_BIT = [1 << GPIO_PINS[fpga_id][user_type] for fpga_id, user_type in STATE_BIT]
+LED_PIN_MASK = sum(PIN_MASK_FOR_BIT)
+
+# state_bits -> LED pins to drive HIGH, i.e. LEDs OFF (inverted logic for UDN2981A)
+HIGH_PINS_FOR_STATE = [LED_PIN_MASK] * (1 << len(PIN_MASK_FOR_BIT))
+for _state in range(1, len(HIGH_PINS_FOR_STATE)):
+    _lowest = _state & -_state  # Build on the state without its lowest lit LED
+    HIGH_PINS_FOR_STATE[_state] = (HIGH_PINS_FOR_STATE[_state ^ _lowest]
+                                   & ~PIN_MASK_FOR_BIT[_lowest.bit_length() - 1])
+
+COMMAND_TOPIC_FILTER = "fpga/command/+/+"
+TRUE_PAYLOADS = frozenset((b'true', b'True', b'TRUE', b'1'))  # Anything else is OFF
+
+# Command topic -> (fpga_id, user_type, pin, state bit)
+TOPIC_TABLE = {
+    f"fpga/command/{fpga_id}/{user_type}":
+        (fpga_id, user_type, pin, STATE_BIT[(fpga_id, user_type)])
+    for fpga_id, pins in GPIO_PINS.items()
+    for user_type, pin in pins.items()
 }
+STATUS_TOPIC_FOR_BIT = [f"fpga/status/{fpga_id}/{user_type}" for fpga_id, user_type in STATE_BIT]
+
+def find_gpio_chip():
+    """Path of the gpiochip for the 40-pin header, or None if not found"""
+    for path in sorted(glob.glob('/dev/gpiochip*')):
+        try:
+            with gpiod.Chip(path) as chip:
+                if chip.get_info().label in GPIO_CHIP_LABELS:
+                    return path
+        except OSError:
+            continue
+    return None
+
+def sleep_until(deadline):
+    """Sleep until a time.monotonic() deadline, absorbing early wakeups"""
+    while (remaining := deadline - time.monotonic()) > 0:
+        time.sleep(remaining)
+
+def create_mqtt_client(transport):
+    """Create an MQTTv5 client with the 1.x callback signatures"""
+    if hasattr(mqtt, 'CallbackAPIVersion'):  # paho-mqtt >= 2.0
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1,
+                           protocol=mqtt.MQTTv5, transport=transport)
+    return mqtt.Client(protocol=mqtt.MQTTv5, transport=transport)
 
 class IndividualPinController:
     def __init__(self):
+        log_listener.start()
+        atexit.register(log_listener.stop)  # Drain queued records on exit
         self.mqtt_client = None
         self.running = False
+        self.stop_event = Event()
+        self.state_bits = 0  # One bit per LED, indexed by STATE_BIT - 1 = LED ON
+        self.gpio_high_mask = LED_PIN_MASK  # Mirror of LED pins driven HIGH - all OFF after setup
+        self.gpio_lock = RLock()  # Re-entrant - a second signal can re-enter cleanup_and_exit
+        self.gpio_chip_path = None
+        self.gpio_lines = None
+        self.pending_ops = deque()
+        self.pending_event = Event()
+        self.status_queue = queue.SimpleQueue()
         self.setup_gpio()
         signal.signal(signal.SIGINT, self.cleanup_and_exit)
         signal.signal(signal.SIGTERM, self.cleanup_and_exit)
         
-    def run_pinctrl(self, command):
-        """Run sudo pinctrl command"""
+    def run_pinctrl(self, *args):
+        """Run pinctrl directly - needs gpio group access, not sudo"""
         try:
-            cmd = f"sudo pinctrl {command}"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            return result.returncode == 0, result.stdout.strip()
+            result = subprocess.run([PINCTRL_PATH, *args],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return result.returncode == 0
         except Exception as e:
             logger.error(f"Error running pinctrl: {e}")
-            return False, ""
+            return False
     
-    def set_pin_output(self, pin):
-        """Set pin as output"""
-        success, output = self.run_pinctrl(f"set {pin} op")
-        return success
+    def request_gpio_lines(self, pins):
+        """Claim pins as outputs, driven HIGH (LED OFF), for the process lifetime"""
+        if gpiod is None or not hasattr(gpiod, 'request_lines'):
+            return None
+        self.gpio_chip_path = find_gpio_chip()
+        if self.gpio_chip_path is None:
+            logger.warning(f"No gpiochip labelled {'/'.join(GPIO_CHIP_LABELS)} - using pinctrl")
+            return None
+        try:
+            return gpiod.request_lines(
+                self.gpio_chip_path,
+                consumer="fpga-controller",
+                config={tuple(pins): gpiod.LineSettings(
+                    direction=gpiod.line.Direction.OUTPUT,
+                    output_value=gpiod.line.Value.ACTIVE)})
+        except OSError as e:
+            logger.warning(f"Cannot request lines on {self.gpio_chip_path} ({e}) - using pinctrl")
+            return None
+    
+    def set_pins_output(self, pins):
+        """Set pins as outputs"""
+        if self.gpio_lines is not None:
+            return True  # Configured when the lines were requested
+        if gpio_regs is None:
+            return all(self.run_pinctrl("set", str(pin), "op") for pin in pins)
+        with self.gpio_lock:
+            for pin in pins:
+                reg = (GPFSEL0 >> 2) + pin // 10
+                shift = (pin % 10) * 3
+                gpio_regs[reg] = (gpio_regs[reg] & ~(0b111 << shift)) | (GPIO_FSEL_OUTPUT << shift)
+        return True
     
     def set_pin_high(self, pin):
         """Set pin high (3.3V) - LED OFF for UDN2981A"""
-        success, output = self.run_pinctrl(f"set {pin} dh")
-        if success:
-            logger.info(f"GPIO {pin} -> HIGH (3.3V) - LED OFF")
-        return success
+        if gpio_regs is not None:
+            gpio_regs[(GPSET0 >> 2) + (pin >> 5)] = 1 << (pin & 31)
+            return True
+        if self.gpio_lines is not None:
+            self.gpio_lines.set_value(pin, gpiod.line.Value.ACTIVE)
+            return True
+        return self.run_pinctrl("set", str(pin), "dh")
     
     def set_pin_low(self, pin):
         """Set pin low (0V) - LED ON for UDN2981A"""
-        success, output = self.run_pinctrl(f"set {pin} dl")
-        if success:
-            logger.info(f"GPIO {pin} -> LOW (0V) - LED ON")
-        return success
+        if gpio_regs is not None:
+            gpio_regs[(GPCLR0 >> 2) + (pin >> 5)] = 1 << (pin & 31)
+            return True
+        if self.gpio_lines is not None:
+            self.gpio_lines.set_value(pin, gpiod.line.Value.INACTIVE)
+            return True
+        return self.run_pinctrl("set", str(pin), "dl")
+    
+    def write_pin_masks(self, set_mask, clr_mask):
+        """Drive pins HIGH/LOW from pin bitmasks - returns the mask of pins that failed"""
+        if gpio_regs is not None:
+            for bank in range(GPIO_BANKS):
+                bank_set = (set_mask >> (bank << 5)) & 0xFFFFFFFF
+                bank_clr = (clr_mask >> (bank << 5)) & 0xFFFFFFFF
+                if bank_set:
+                    gpio_regs[(GPSET0 >> 2) + bank] = bank_set
+                if bank_clr:
+                    gpio_regs[(GPCLR0 >> 2) + bank] = bank_clr
+            return 0
+        if self.gpio_lines is not None:
+            values = {}
+            for pin in range(GPIO_BANKS << 5):
+                if (set_mask >> pin) & 1:
+                    values[pin] = gpiod.line.Value.ACTIVE
+                elif (clr_mask >> pin) & 1:
+                    values[pin] = gpiod.line.Value.INACTIVE
+            if values:
+                self.gpio_lines.set_values(values)
+            return 0
+        failed = 0
+        for pin in range(GPIO_BANKS << 5):
+            if (set_mask >> pin) & 1:
+                if not self.set_pin_high(pin):
+                    failed |= 1 << pin
+            elif (clr_mask >> pin) & 1:
+                if not self.set_pin_low(pin):
+                    failed |= 1 << pin
+        if failed:
+            logger.error(f"Failed to write GPIO pin mask {failed:#x}")
+        return failed
     
     def setup_gpio(self):
         """Initialize all GPIO pins - start with LEDs OFF"""
         logger.info("Setting up GPIO pins for UDN2981A (inverted logic):")
+        all_pins = [pin for pins in GPIO_PINS.values() for pin in pins.values()]
+        if gpio_regs is None:
+            self.gpio_lines = self.request_gpio_lines(all_pins)
+        if gpio_regs is not None:
+            logger.info(f"GPIO access: {GPIO_MEM_PATH}")
+        elif self.gpio_lines is not None:
+            logger.info(f"GPIO access: libgpiod {self.gpio_chip_path}")
+        else:
+            logger.info(f"GPIO access: {PINCTRL_PATH}")
+        # Latch HIGH before switching to output so no LED flashes on
         for fpga_id, pins in GPIO_PINS.items():
             for led_type, pin in pins.items():
-                if not self.set_pin_output(pin):
-                    raise Exception(f"Failed to set GPIO {pin} as output")
                 if not self.set_pin_high(pin):  # HIGH = LED OFF for UDN2981A
                     raise Exception(f"Failed to set GPIO {pin} high")
                 logger.info(f"  {fpga_id} {led_type.upper()} -> GPIO {pin} (OFF)")
+        if not self.set_pins_output(all_pins):
+            raise Exception("Failed to set GPIO pins as outputs")
         logger.info("GPIO setup complete - all LEDs OFF")
     
     def setup_mqtt(self):
-        """Setup MQTT client"""
-        self.mqtt_client = mqtt.Client()
+        """Setup MQTT client - Unix socket if the broker offers one, else TCP"""
+        # Unix socket transport needs paho-mqtt >= 2.0
+        if not hasattr(mqtt, 'CallbackAPIVersion'):
+            logger.info(f"MQTT Unix socket needs paho-mqtt >= 2.0 - using TCP {MQTT_HOST}:{MQTT_PORT}")
+        elif not os.path.exists(MQTT_SOCKET_PATH):
+            logger.info(f"No MQTT Unix socket at {MQTT_SOCKET_PATH} - using TCP {MQTT_HOST}:{MQTT_PORT}")
+        else:
+            self.mqtt_client = create_mqtt_client("unix")
+            self.configure_mqtt_client()
+            try:
+                self.mqtt_client.connect(MQTT_SOCKET_PATH, keepalive=MQTT_KEEPALIVE)
+                logger.info(f"Using MQTT Unix socket {MQTT_SOCKET_PATH}")
+                return
+            except OSError as e:
+                logger.warning(f"Cannot connect to {MQTT_SOCKET_PATH} ({e}) - using TCP")
+        self.mqtt_client = create_mqtt_client("tcp")
+        self.configure_mqtt_client()
+        self.mqtt_client.connect(MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE)
+    
+    def configure_mqtt_client(self):
+        """Attach callbacks and tune the client for small, latency-bound messages"""
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
-        self.mqtt_client.connect("localhost", 1883, 60)
+        self.mqtt_client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        self.mqtt_client.reconnect_delay_set(*MQTT_RECONNECT_DELAY)
     
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         """MQTT connect callback"""
         if rc == 0:
             logger.info("Connected to MQTT broker")
             
-            # Subscribe to all individual user command topics
-            topics = []
-            for fpga_id in GPIO_PINS.keys():
-                for user_type in ['dan', 'nate', 'ben', 'loaded']:
-                    topic = f"fpga/command/{fpga_id}/{user_type}"
-                    topics.append(topic)
-                    client.subscribe(topic)
+            # Status replies are tiny - fixed buffers, and no waiting on Nagle
+            sock = client.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MQTT_SOCKET_BUFFER)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MQTT_SOCKET_BUFFER)
+            if sock.family in (socket.AF_INET, socket.AF_INET6):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            
+            # One wildcard SUBSCRIBE covers every command topic - on_message
+            # drops anything not in TOPIC_TABLE
+            client.subscribe([(COMMAND_TOPIC_FILTER, 0)])
             
-            logger.info(f"Subscribed to {len(topics)} topics")
+            logger.info(f"Subscribed to {COMMAND_TOPIC_FILTER} ({len(TOPIC_TABLE)} topics)")
         else:
             logger.error(f"MQTT connection failed: {rc}")
     
     def on_message(self, client, userdata, msg):
         """Handle MQTT messages"""
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8').strip()
-            logger.info(f"Received: {topic} = '{payload}'")
+            # Topic: fpga/command/fpga1/dan
+            entry = TOPIC_TABLE.get(msg.topic)
+            if entry is None:
+                return
+            # Status is published by the flusher once the pin has been written
+            self.handle_pin_command(entry, msg.payload)
             
-            # Parse topic: fpga/command/fpga1/dan
-            parts = topic.split('/')
-            if len(parts) == 4 and parts[0] == 'fpga' and parts[1] == 'command':
-                fpga_id = parts[2]    # fpga1, fpga2, fpga3
-                user_type = parts[3]  # dan, nate, ben, loaded
-                
-                if fpga_id in GPIO_PINS and user_type in GPIO_PINS[fpga_id]:
-                    self.handle_pin_command(fpga_id, user_type, payload)
-                    
-                    # Publish status back
-                    status_topic = f"fpga/status/{fpga_id}/{user_type}"
-                    client.publish(status_topic, payload)
-                    
         except Exception as e:
             logger.error(f"Error processing message: {e}")
     
-    def handle_pin_command(self, fpga_id, user_type, value_str):
-        """Handle individual pin command - inverted logic for UDN2981A"""
-        pin = GPIO_PINS[fpga_id][user_type]
-        value = value_str.lower() == 'true'
+    def is_on(self, fpga_id, user_type):
+        """Current LED state as last commanded over MQTT"""
+        return (self.state_bits >> STATE_BIT[(fpga_id, user_type)]) & 1
+    
+    def publish_loop(self):
+        """Status publisher thread - keeps publishing off the MQTT callback"""
+        while True:
+            item = self.status_queue.get()
+            if item is None:
+                break
+            status_topic, payload = item
+            self.mqtt_client.publish(status_topic, payload, qos=0)
+    
+    def handle_pin_command(self, entry, payload):
+        """Handle individual pin command - queued for the batch flusher"""
+        fpga_id, user_type, pin, bit = entry
+        value = payload in TRUE_PAYLOADS
         
         # Update state
-        current_state[fpga_id][user_type] = value
+        self.state_bits = (self.state_bits & ~(1 << bit)) | (value << bit)
+        
+        # Wake the flusher - it applies state_bits with inverted logic
+        self.pending_ops.append(bit)
+        self.pending_event.set()
+        # One lazily formatted record per command - free unless DEBUG is enabled
+        logger.debug("%s %s pin=%d -> %s", fpga_id, user_type, pin, "ON" if value else "OFF")
+    
+    def flush_pending(self):
+        """Bring the GPIO pins in line with state_bits, then queue status replies"""
+        with self.gpio_lock:
+            if not self.running:
+                return  # cleanup_and_exit already drove every LED OFF
+            # Drain before reading state_bits - a queued bit's state is already set
+            commanded = 0
+            while self.pending_ops:
+                commanded |= 1 << self.pending_ops.popleft()
+            state = self.state_bits
+            desired = HIGH_PINS_FOR_STATE[state]
+            set_mask = desired & ~self.gpio_high_mask
+            clr_mask = self.gpio_high_mask & ~desired
+            failed = 0
+            if set_mask or clr_mask:
+                failed = self.write_pin_masks(set_mask, clr_mask)
+                # Failed pins keep their old mirror bit so the next flush retries them
+                self.gpio_high_mask = (desired & ~failed) | (self.gpio_high_mask & failed)
         
-        # Control GPIO pin with inverted logic
-        if value:  # Want LED ON
-            self.set_pin_low(pin)   # Set GPIO LOW to turn LED ON
-            logger.info(f"{fpga_id} {user_type.upper()} LED ON - GPIO {pin} LOW")
-        else:      # Want LED OFF  
-            self.set_pin_high(pin)  # Set GPIO HIGH to turn LED OFF
-            logger.info(f"{fpga_id} {user_type.upper()} LED OFF - GPIO {pin} HIGH")
+        # Report the applied state of each commanded LED whose pin was written
+        for bit, status_topic in enumerate(STATUS_TOPIC_FOR_BIT):
+            if (commanded >> bit) & 1 and not failed & PIN_MASK_FOR_BIT[bit]:
+                self.status_queue.put((status_topic, b'true' if (state >> bit) & 1 else b'false'))
+    
+    def flush_loop(self):
+        """Batch flusher thread - waits for a burst of commands, then writes it"""
+        while self.running:
+            self.pending_event.wait()
+            self.pending_event.clear()
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(self.pending_ops) < BATCH_MAX_OPS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.pending_event.wait(remaining):
+                    break
+                self.pending_event.clear()
+            try:
+                self.flush_pending()
+            except Exception as e:
+                # Keep the flusher alive - the next command retries the write
+                logger.error(f"Error writing GPIO pins: {e}")
     
     def test_all_leds(self):
-        """Test all LEDs individually"""
-        logger.info("Testing all individual LEDs...")
+        """Test all LEDs at once - set FPGA_SKIP_LED_TEST=1 to skip"""
+        if os.environ.get('FPGA_SKIP_LED_TEST', '').lower() in ('1', 'true', 'yes'):
+            logger.info("LED test skipped (FPGA_SKIP_LED_TEST)")
+            return
+        logger.info("Testing all LEDs...")
         
-        for fpga_id, pins in GPIO_PINS.items():
-            logger.info(f"Testing {fpga_id}...")
-            for user_type, pin in pins.items():
-                self.set_pin_low(pin)   # LOW = LED ON for UDN2981A
-                time.sleep(0.3)
-                self.set_pin_high(pin)  # HIGH = LED OFF for UDN2981A
-                time.sleep(0.1)
+        deadline = time.monotonic() + LED_TEST_DURATION
+        self.write_pin_masks(0, LED_PIN_MASK)  # LOW = LED ON for UDN2981A
+        sleep_until(deadline)
+        failed = self.write_pin_masks(LED_PIN_MASK, 0)  # HIGH = LED OFF for UDN2981A
+        # Pins that didn't go HIGH may still be lit - clear their mirror bit so
+        # the next command for them is written instead of diffing to nothing
+        self.gpio_high_mask &= ~failed
         
         logger.info("LED test complete")
     
     def cleanup_and_exit(self, signum=None, frame=None):
         """Clean shutdown - turn all LEDs OFF"""
         logger.info("Cleaning up...")
-        for fpga_id, pins in GPIO_PINS.items():
-            for user_type, pin in pins.items():
-                self.set_pin_high(pin)  # HIGH = LED OFF for UDN2981A
+        self.running = False
+        self.stop_event.set()
+        self.pending_event.set()
+        self.status_queue.put(None)
+        # Waits for any flush in progress, which then can't clear pins afterwards
+        with self.gpio_lock:
+            for fpga_id, pins in GPIO_PINS.items():
+                for user_type, pin in pins.items():
+                    self.set_pin_high(pin)  # HIGH = LED OFF for UDN2981A
         if self.mqtt_client:
             self.mqtt_client.disconnect()
         logger.info("Cleanup complete")
@@ -195,13 +472,16 @@ class IndividualPinController:
         self.test_all_leds()
         self.setup_mqtt()
         self.running = True
+        Thread(target=self.flush_loop, name="gpio-flush", daemon=True).start()
+        Thread(target=self.publish_loop, name="mqtt-publish", daemon=True).start()
         self.mqtt_client.loop_start()
         
         logger.info("Controller ready! Listening for commands...")
         
+        # MQTT, GPIO and publishing run on their own threads - block until a
+        # signal handler calls cleanup_and_exit, without periodic wakeups
         try:
-            while self.running:
-                time.sleep(10)
+            self.stop_event.wait()
         except KeyboardInterrupt:
             self.cleanup_and_exit()
 
@@ -38,6 +38,8 @@ sudo tee /etc/mosquitto/mosquitto.conf > /dev/null <<EOF
 allow_anonymous true
 listener 1883 0.0.0.0
 protocol mqtt
+listener 0 /run/mosquitto/mqtt.sock
+protocol mqtt
 listener 9001 0.0.0.0  
 protocol websockets
 log_dest file /var/log/mosquitto/mosquitto.log
@@ -60,6 +62,8 @@ After=network.target
 Type=notify
 NotifyAccess=main
 ExecStart=/usr/sbin/mosquitto -c /etc/mosquitto/mosquitto.conf
+ExecStartPost=/bin/chmod 666 /run/mosquitto/mqtt.sock
+RuntimeDirectory=mosquitto
 User=root
 Group=root
 Restart=always
@@ -146,6 +150,7 @@ Wants=mosquitto.service
 Type=simple
 User=pi
 Group=pi
+SupplementaryGroups=gpio
 WorkingDirectory=/home/pi/fpga_controller
 ExecStart=/usr/bin/python3 /home/pi/fpga_controller/fpga_gpio_controller.py
 Restart=always
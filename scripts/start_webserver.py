@@ -1,23 +1,56 @@
 #!/usr/bin/env python3
 """
 Simple HTTP server for hosting FPGA Controller web interface
-Serves files from the current directory on port 8080
+Serves files from the current directory on port 8080, one thread per connection
 """
 
 import http.server
 import socketserver
+import fcntl
+import functools
 import os
 import socket
+import struct
 
+SIOCGIFADDR = 0x8915  # Linux ioctl: get an interface's IPv4 address
+RTF_UP = 0x0001       # /proc/net/route flag: route is usable
+
+def get_default_route_interface():
+    """Name of the interface carrying the IPv4 default route, or None"""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)  # Header line
+            routes = [line.split() for line in f]
+    except OSError:
+        return None
+    # Fields: Iface Destination Gateway Flags RefCnt Use Metric ...
+    defaults = [r for r in routes
+                if len(r) > 6 and r[1] == "00000000" and int(r[3], 16) & RTF_UP]
+    if not defaults:
+        return None
+    return min(defaults, key=lambda r: int(r[6]))[0]
+
+@functools.lru_cache(maxsize=1)
 def get_ip_address():
-    """Get the local IP address"""
+    """Get the local IP address of the default-route interface"""
     try:
-        # Connect to a remote address to determine local IP
+        # Ask the kernel for the interface's address - no packets are sent
+        default_iface = get_default_route_interface()
+        if default_iface is not None:
+            names = [default_iface]
+        else:
+            names = [name for _, name in socket.if_nameindex() if name != "lo"]
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.connect(("8.8.8.8", 80))
-            return s.getsockname()[0]
+            for name in names:
+                try:
+                    ifreq = fcntl.ioctl(s.fileno(), SIOCGIFADDR,
+                                        struct.pack("256s", name.encode()[:15]))
+                except OSError:
+                    continue  # Interface is down or has no IPv4 address
+                return socket.inet_ntoa(ifreq[20:24])
     except Exception:
-        return "localhost"
+        pass
+    return "localhost"
 
 def main():
     PORT = 8080
@@ -42,16 +75,32 @@ def main():
     
     # Custom handler to add CORS headers if needed
     class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+        disable_nagle_algorithm = True  # TCP_NODELAY on accepted sockets
+        
+        def copyfile(self, source, outputfile):
+            # Send files with sendfile() so the content never passes through Python
+            try:
+                source.fileno()
+            except (AttributeError, OSError):  # In-memory bodies, e.g. directory listings
+                return super().copyfile(source, outputfile)
+            outputfile.flush()
+            self.connection.sendfile(source)
+        
         def end_headers(self):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
             super().end_headers()
     
+    # Handle each connection on its own thread so one slow client can't block others
+    class ThreadingWebServer(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+    
     Handler = CORSHTTPRequestHandler
     
     try:
-        with socketserver.TCPServer(("", PORT), Handler) as httpd:
+        with ThreadingWebServer(("", PORT), Handler) as httpd:
             print(f"FPGA Controller Web Server")
             print(f"Serving at: http://{ip_address}:{PORT}")
             print(f"Local access: http://localhost:{PORT}")